@@ -1,12 +1,28 @@
 import re
 from enum import IntEnum
-from collections import namedtuple, defaultdict
+from collections import namedtuple
+from functools import partial
 from string import ascii_letters
 
 
 
 Token = namedtuple('Token', 'value code')
 
+# builds a Token from a (value, code) pair, skipping the argument
+# handling done by the namedtuple constructor
+_new_token = partial(tuple.__new__, Token)
+
+# marks that no token has been read ahead
+_MISSING = object()
+
+# lowercase hex digits accepted in ^^xx character codes
+_HEX_DIGITS = frozenset('0123456789abcdef')
+
+# runs of catcodes in the bytes built by Tokenizer._encode_catcodes
+_LETTERS_RE = re.compile(b'\x0b*')
+_TEXT_RE = re.compile(b'[\x0b\x0c]*')
+_SPACES_RE = re.compile(b'\x0a*')
+
 
 
 class State(IntEnum):
@@ -72,50 +88,156 @@ class CategoryCode(IntEnum):
 
 
 
+# plain int values of the states and catcodes compared while scanning,
+# which avoids the enum attribute lookups in the hot path
+_NEW_LINE = int(State.NewLine)
+_SKIPPING_SPACES = int(State.SkippingSpaces)
+_MIDDLE_OF_LINE = int(State.MiddleOfLine)
+_PARAMETER_CHARACTER = int(CategoryCode.ParameterCharacter)
+_SUPERSCRIPT = int(CategoryCode.Superscript)
+_SPACE = int(CategoryCode.Space)
+_LETTER = int(CategoryCode.Letter)
+_PARAMETER_TOKEN = int(CategoryCode.ParameterToken)
+
+# enum members indexed by their int value; tokens and the tokenizer state
+# hold enum members, the ints above are only used while scanning
+_CATEGORY_CODES = tuple(CategoryCode)
+_STATES = tuple(State)
+_CONTROL_SEQUENCE_CODE = CategoryCode.ControlSequence
+_SUPERSCRIPT_CODE = CategoryCode.Superscript
+_LETTER_CODE = CategoryCode.Letter
+_OTHER_CODE = CategoryCode.Other
+
+# tokens that are emitted over and over, shared instead of rebuilt
+_PAR_TOKEN = Token('\\par', CategoryCode.ControlSequence)
+_SPACE_TOKEN = Token(' ', CategoryCode.Space)
+
+# State transitions for the catcodes whose meaning depends on the state.
+# Each table is indexed by the current state and holds the next state
+# and the token to emit, if any.
+_END_OF_LINE_TRANSITIONS = (
+    # NewLine: an empty line ends the paragraph
+    (_NEW_LINE, _PAR_TOKEN),
+    # SkippingSpaces
+    (_NEW_LINE, None),
+    # MiddleOfLine: the end of line becomes a space
+    (_NEW_LINE, _SPACE_TOKEN),
+)
+_SPACE_TRANSITIONS = (
+    # NewLine
+    (_NEW_LINE, None),
+    # SkippingSpaces
+    (_SKIPPING_SPACES, None),
+    # MiddleOfLine
+    (_SKIPPING_SPACES, _SPACE_TOKEN),
+)
+
+
+
+def _make_default_catcodes():
+    """Returns the catcode table of IniTeX with the plain TeX defaults."""
+    # caracters not registered in catcodes get a code 12 (Other)
+    catcodes = [int(CategoryCode.Other)] * 256
+    # register defaults
+    for char, code in {
+        '\\':   CategoryCode.EscapeCharacter,
+        '{' :   CategoryCode.BeginningOfGroup,
+        '}' :   CategoryCode.EndOfGroup,
+        '$' :   CategoryCode.MathShift,
+        '&' :   CategoryCode.AlignmentTab,
+        '\r':   CategoryCode.EndOfLine,
+        '#' :   CategoryCode.ParameterCharacter,
+        '^' :   CategoryCode.Superscript,
+        '_' :   CategoryCode.Subscript,
+        '\0':   CategoryCode.Ignored,
+        ' ' :   CategoryCode.Space,
+        '\t':   CategoryCode.Space,
+        '~' :   CategoryCode.Active,
+        '%' :   CategoryCode.Comment,
+        '\x7f': CategoryCode.Invalid,
+    }.items():
+        catcodes[ord(char)] = int(code)
+    # register ascii letters
+    for c in ascii_letters:
+        catcodes[ord(c)] = int(CategoryCode.Letter)
+    return catcodes
+
+# built once and copied by every tokenizer
+_DEFAULT_CATCODES = _make_default_catcodes()
+
+
+
+class _CatcodeView:
+    """Dict-like view of a tokenizer's catcodes, keyed by character.
+
+    Writes go through Tokenizer.set_catcode so the tokenizer caches stay in sync.
+    """
+
+    def __init__(self, tokenizer):
+        self._tokenizer = tokenizer
+
+    def __getitem__(self, char):
+        return self._tokenizer.get_catcode(char)
+
+    def __setitem__(self, char, code):
+        self._tokenizer.set_catcode(char, code)
+
+    def update(self, catcodes=(), **kwargs):
+        for char, code in dict(catcodes, **kwargs).items():
+            self._tokenizer.set_catcode(char, code)
+
+
+
 class Tokenizer:
 
-    def __init__(self, text=None, endlinechar=13):
-        # caracters not registered in catcodes get a code 12 (Other)
-        self.catcodes = defaultdict(lambda: CategoryCode.Other)
-        # register defaults
-        self.catcodes.update({
-            '\\':   CategoryCode.EscapeCharacter,
-            '{' :   CategoryCode.BeginningOfGroup,
-            '}' :   CategoryCode.EndOfGroup,
-            '$' :   CategoryCode.MathShift,
-            '&' :   CategoryCode.AlignmentTab,
-            '\r':   CategoryCode.EndOfLine,
-            '#' :   CategoryCode.ParameterCharacter,
-            '^' :   CategoryCode.Superscript,
-            '_' :   CategoryCode.Subscript,
-            '\0':   CategoryCode.Ignored,
-            ' ' :   CategoryCode.Space,
-            '\t':   CategoryCode.Space,
-            '~' :   CategoryCode.Active,
-            '%' :   CategoryCode.Comment,
-            '\x7f': CategoryCode.Invalid,
-        })
-        # register ascii letters
-        for c in ascii_letters:
-            self.catcodes[c] = CategoryCode.Letter
+    def __init__(self, text=None, endlinechar=13, coalesce_text=False):
+        # emit runs of letters and other characters as a single token,
+        # with code Letter if the run is made only of letters and Other otherwise;
+        # this is fixed when the handlers are registered below
+        self.coalesce_text = coalesce_text
+        # start from a copy of the default catcodes;
+        # only set_catcode() changes it, so the caches below stay in sync
+        self._catcodes = _DEFAULT_CATCODES[:]
+        self._line_catcodes = None
+        self._char_tokens = {}
+        # register handlers for catcodes that don't simply emit the character
+        self._handlers = [None] * len(CategoryCode)
+        self._handlers[CategoryCode.EscapeCharacter] = self._handle_escape
+        self._handlers[CategoryCode.EndOfLine] = self._handle_end_of_line
+        self._handlers[CategoryCode.ParameterCharacter] = self._handle_parameter
+        self._handlers[CategoryCode.Superscript] = self._handle_superscript
+        self._handlers[CategoryCode.Ignored] = self._handle_ignored
+        self._handlers[CategoryCode.Space] = self._handle_space
+        self._handlers[CategoryCode.Comment] = self._handle_comment
+        self._handlers[CategoryCode.Invalid] = self._handle_invalid
+        if coalesce_text:
+            self._handlers[CategoryCode.Letter] = self._handle_text
+            self._handlers[CategoryCode.Other] = self._handle_text
         # set default endlinechar
         self.set_endlinechar(endlinechar)
         # reset tokenizer
         self.reset(text)
 
     def __iter__(self):
-        while self.has_token():
-            yield self.get_token()
+        token = self.get_token()
+        while token is not None:
+            yield token
+            token = self.get_token()
 
     def reset(self, text=None):
         """Resets the tokenizer with optional new input text."""
         self.state = State.NewLine
         self.currline = 0
         self.currchar = 0
-        self.next_token = None
+        self.next_token = _MISSING
         if text is not None:
             self.text = text.strip()
-            self.lines = list(self.lines())
+            endlinechar = self.endlinechar
+            if endlinechar is None:
+                self.lines = [line.rstrip() for line in self.text.splitlines()]
+            else:
+                self.lines = [line.rstrip() + endlinechar for line in self.text.splitlines()]
+            self._line_catcodes = None
 
     def set_endlinechar(self, char):
         if isinstance(char, str) and len(char) == 1 and 0 <= ord(char) < 255:
@@ -125,125 +247,199 @@ class Tokenizer:
         else:
             self.endlinechar = None
 
-    def lines(self):
-        if self.text is not None:
-            for line in self.text.splitlines():
-                line = line.rstrip()
-                if self.endlinechar is not None:
-                    line += self.endlinechar
-                yield line
+    @property
+    def catcodes(self):
+        """Dict-like view of the catcodes; assigning to it calls set_catcode."""
+        return _CatcodeView(self)
+
+    def set_catcode(self, char, code):
+        """Assigns a category code to a character with code point below 256."""
+        if not (isinstance(char, str) and len(char) == 1 and ord(char) < 256):
+            raise ValueError('catcodes can only be assigned to characters below 256')
+        code = CategoryCode(code)
+        if code > CategoryCode.Invalid:
+            raise ValueError(f'{code!r} is not a catcode that can be assigned to a character')
+        self._catcodes[ord(char)] = int(code)
+        # line catcodes must be encoded again with the new table
+        self._line_catcodes = None
+        # cached single char tokens may have the old catcode
+        self._char_tokens = {}
+
+    def get_catcode(self, char):
+        """Returns the category code of a character."""
+        n = ord(char)
+        return _CATEGORY_CODES[self._catcodes[n]] if n < 256 else CategoryCode.Other
+
+    def _encode_catcodes(self):
+        """Returns the catcodes of each input line as bytes, one byte per character."""
+        byte_table = bytes(self._catcodes)
+        table = dict(enumerate(self._catcodes))
+        other = bytes.maketrans(b'?', bytes([CategoryCode.Other]))
+        line_catcodes = []
+        for line in self.lines:
+            try:
+                # latin-1 lines are mapped to catcodes by a single bytes.translate
+                codes = line.encode('latin-1').translate(byte_table)
+            except UnicodeEncodeError:
+                # characters outside the table are left untranslated by str.translate
+                # and become '?' when encoded, which is then mapped to Other
+                codes = line.translate(table).encode('latin-1', 'replace').translate(other)
+            line_catcodes.append(codes)
+        return line_catcodes
 
     def peek(self):
-        if self.next_token is None:
-            self.next_token = self.make_token()
-        return self.next_token
+        token = self.next_token
+        if token is _MISSING:
+            token = self.next_token = self.make_token()
+        return token
 
     def has_token(self):
         return self.peek() is not None
 
     def get_token(self):
-        if self.next_token is None:
-            token = self.make_token()
-        else:
-            token = self.next_token
-            self.next_token = None
+        token = self.next_token
+        if token is _MISSING:
+            return self.make_token()
+        self.next_token = _MISSING
         return token
 
+    def tokenize_all(self):
+        """Returns a list with all the remaining tokens."""
+        tokens = []
+        append = tokens.append
+        make_token = self.make_token
+        # a peeked token comes first
+        token = self.get_token()
+        while token is not None:
+            append(token)
+            token = make_token()
+        return tokens
+
     def make_token(self):
-        while self.currline < len(self.lines):
-            # get current line
-            line = self.lines[self.currline]
-            while self.currchar < len(line):
-                # get current char
-                char = line[self.currchar]
-                code = self.catcodes[char]
-                self.currchar += 1
-                # start a token
-                token = char
-                if code == CategoryCode.EscapeCharacter:
-                    char = line[self.currchar]
-                    code = self.catcodes[char]
-                    self.currchar += 1
-                    if code == CategoryCode.Letter:
-                        # control word
-                        self.state = State.SkippingSpaces
-                        token += char
-                        while self.currchar < len(line):
-                            char = line[self.currchar]
-                            code = self.catcodes[char]
-                            if code == CategoryCode.Letter:
-                                token += char
-                                self.currchar += 1
-                            else:
-                                break
-                    elif code == CategoryCode.Space:
-                        # control space
-                        self.state = State.SkippingSpaces
-                        token += char
-                    else:
-                        # control symbol
-                        self.state = State.MiddleOfLine
-                        token += char
-                    return Token(token, CategoryCode.ControlSequence)
-                elif code == CategoryCode.EndOfLine:
-                    # skip rest of current line
-                    self.currline += 1
-                    self.currchar = 0
-                    # remember state
-                    prev_state = self.state
-                    # transition to new state
-                    self.state = State.NewLine
-                    if prev_state == State.NewLine:
-                        return Token('\\par', CategoryCode.ControlSequence)
-                    elif prev_state == State.SkippingSpaces:
-                        break
-                    elif prev_state == State.MiddleOfLine:
-                        return Token(' ', CategoryCode.Space)
-                elif code == CategoryCode.ParameterCharacter:
-                    if self.currchar < len(line):
-                        char = line[self.currchar]
-                        if char.isdigit():
-                            # build a parameter token
-                            token += char
-                            code = CategoryCode.ParameterToken
-                            self.currchar += 1
-                        elif self.catcodes[char] == CategoryCode.ParameterCharacter:
-                            # ignore second parameter char
-                            self.currchar += 1
-                    self.state = State.MiddleOfLine
-                    return Token(token, code)
-                elif code == CategoryCode.Superscript:
-                    self.state = State.MiddleOfLine
-                    chars = line[self.currchar:self.currchar+3]
-                    if len(chars) > 1 and self.catcodes[chars[0]] == CategoryCode.Superscript:
-                        enc = chars[1:]
-                        if re.match(r'[0-9a-f][0-9a-f]', enc):
-                            n = int(enc, 16)
-                            if 0 <= n < 256:
-                                token = chr(n)
-                                code = self.catcodes[token]
-                                self.currchar += 3
-                                return Token(token, code)
-                            n = ord(enc[0])
-                            if 0 <= n < 128:
-                                token = chr((n + 64) % 128)
-                                code = self.catcodes[token]
-                                self.currchar += 2
-                                return Token(token, code)
-                    return Token(token, code)
-                elif code == CategoryCode.Ignored:
-                    pass
-                elif code == CategoryCode.Space:
-                    if self.state == State.MiddleOfLine:
-                        self.state = State.SkippingSpaces
-                        return Token(' ', CategoryCode.Space)
-                elif code == CategoryCode.Comment:
-                    # skip rest of current line
-                    self.currline += 1
-                    self.currchar = 0
-                    break
-                elif code == CategoryCode.Invalid:
-                    raise Exception('invalid character')
-                else:
-                    self.state = State.MiddleOfLine
-                    return Token(token, code)
+        lines = self.lines
+        line_catcodes = self._line_catcodes
+        if line_catcodes is None:
+            line_catcodes = self._line_catcodes = self._encode_catcodes()
+        handlers = self._handlers
+        char_tokens = self._char_tokens
+        currline = self.currline
+        currchar = self.currchar
+        state = self.state
+        num_lines = len(lines)
+        try:
+            while currline < num_lines:
+                # get current line
+                line = lines[currline]
+                codes = line_catcodes[currline]
+                line_len = len(line)
+                while currchar < line_len:
+                    # get current char
+                    code = codes[currchar]
+                    currchar += 1
+                    handler = handlers[code]
+                    if handler is None:
+                        # the character is a token by itself
+                        state = _MIDDLE_OF_LINE
+                        char = line[currchar-1]
+                        token = char_tokens.get(char)
+                        if token is None:
+                            token = char_tokens[char] = _new_token((char, _CATEGORY_CODES[code]))
+                        return token
+                    currchar, state, token = handler(line, codes, currchar, state)
+                    if token is not None:
+                        return token
+                # move to next line
+                currline += 1
+                currchar = 0
+        finally:
+            # write the scanning position back to the tokenizer
+            self.currline = currline
+            self.currchar = currchar
+            self.state = _STATES[state]
+
+    # Category code handlers.
+    # Each handler is called with the current line and its catcodes, the position right after
+    # the character that selected it, and the current state.
+    # It returns the new position, the new state, and a token or None.
+
+    def _handle_escape(self, line, codes, currchar, state):
+        start = currchar - 1
+        if currchar == len(line):
+            # an escape character ending a line without endlinechar is a token by itself
+            return currchar, _MIDDLE_OF_LINE, _new_token((line[start], _CONTROL_SEQUENCE_CODE))
+        code = codes[currchar]
+        currchar += 1
+        if code == _LETTER:
+            # control word
+            state = _SKIPPING_SPACES
+            currchar = _LETTERS_RE.match(codes, currchar).end()
+        elif code == _SPACE:
+            # control space
+            state = _SKIPPING_SPACES
+        else:
+            # control symbol
+            state = _MIDDLE_OF_LINE
+        # the token is the escape character and everything scanned after it
+        return currchar, state, _new_token((line[start:currchar], _CONTROL_SEQUENCE_CODE))
+
+    def _handle_text(self, line, codes, currchar, state):
+        # jump to the next char that is neither a letter nor other
+        start = currchar - 1
+        currchar = _TEXT_RE.match(codes, currchar).end()
+        if currchar - start == 1:
+            # a lone character shares its token like in make_token
+            char = line[start]
+            token = self._char_tokens.get(char)
+            if token is None:
+                token = self._char_tokens[char] = _new_token((char, _CATEGORY_CODES[codes[start]]))
+            return currchar, _MIDDLE_OF_LINE, token
+        if _LETTERS_RE.match(codes, start, currchar).end() == currchar:
+            return currchar, _MIDDLE_OF_LINE, _new_token((line[start:currchar], _LETTER_CODE))
+        return currchar, _MIDDLE_OF_LINE, _new_token((line[start:currchar], _OTHER_CODE))
+
+    def _handle_end_of_line(self, line, codes, currchar, state):
+        # skip rest of current line and transition to new state
+        state, token = _END_OF_LINE_TRANSITIONS[state]
+        return len(line), state, token
+
+    def _handle_parameter(self, line, codes, currchar, state):
+        token = line[currchar-1]
+        code = _PARAMETER_CHARACTER
+        if currchar < len(line):
+            char = line[currchar]
+            if char.isdigit():
+                # build a parameter token
+                token = line[currchar-1:currchar+1]
+                code = _PARAMETER_TOKEN
+                currchar += 1
+            elif codes[currchar] == _PARAMETER_CHARACTER:
+                # ignore second parameter char
+                currchar += 1
+        return currchar, _MIDDLE_OF_LINE, _new_token((token, _CATEGORY_CODES[code]))
+
+    def _handle_superscript(self, line, codes, currchar, state):
+        token = line[currchar-1]
+        # check the catcode of the next char before slicing anything
+        if currchar + 1 < len(line) and codes[currchar] == _SUPERSCRIPT:
+            enc = line[currchar+1:currchar+3]
+            if len(enc) == 2 and enc[0] in _HEX_DIGITS and enc[1] in _HEX_DIGITS:
+                # ^^xx with two lowercase hex digits
+                n = int(enc, 16)
+                return currchar + 3, _MIDDLE_OF_LINE, _new_token((chr(n), _CATEGORY_CODES[self._catcodes[n]]))
+        return currchar, _MIDDLE_OF_LINE, _new_token((token, _SUPERSCRIPT_CODE))
+
+    def _handle_ignored(self, line, codes, currchar, state):
+        return currchar, state, None
+
+    def _handle_space(self, line, codes, currchar, state):
+        # the spaces that follow are skipped in every state
+        currchar = _SPACES_RE.match(codes, currchar).end()
+        state, token = _SPACE_TRANSITIONS[state]
+        return currchar, state, token
+
+    def _handle_comment(self, line, codes, currchar, state):
+        # skip rest of current line
+        return len(line), state, None
+
+    def _handle_invalid(self, line, codes, currchar, state):
+        raise Exception('invalid character')
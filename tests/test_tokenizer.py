@@ -0,0 +1,133 @@
+import unittest
+
+from latextools.tokenizer import Tokenizer, CategoryCode, State
+
+
+C = CategoryCode
+
+SAMPLE = '\\section{Intro} Some  text, 42%comment\n\n\\def\\foo#1{##1 $x^2_i$}\\ \\% ~\t^^41 \\@'
+
+# tokens produced by the original tokenizer for SAMPLE
+SAMPLE_TOKENS = [
+    ('\\section', C.ControlSequence), ('{', C.BeginningOfGroup),
+    ('I', C.Letter), ('n', C.Letter), ('t', C.Letter), ('r', C.Letter), ('o', C.Letter),
+    ('}', C.EndOfGroup), (' ', C.Space),
+    ('S', C.Letter), ('o', C.Letter), ('m', C.Letter), ('e', C.Letter), (' ', C.Space),
+    ('t', C.Letter), ('e', C.Letter), ('x', C.Letter), ('t', C.Letter), (',', C.Other), (' ', C.Space),
+    ('4', C.Other), ('2', C.Other), (' ', C.Space),
+    ('\\def', C.ControlSequence), ('\\foo', C.ControlSequence), ('#1', C.ParameterToken),
+    ('{', C.BeginningOfGroup), ('#', C.ParameterCharacter), ('1', C.Other), (' ', C.Space),
+    ('$', C.MathShift), ('x', C.Letter), ('^', C.Superscript), ('2', C.Other),
+    ('_', C.Subscript), ('i', C.Letter), ('$', C.MathShift), ('}', C.EndOfGroup),
+    ('\\ ', C.ControlSequence), ('\\%', C.ControlSequence), (' ', C.Space),
+    ('~', C.Active), (' ', C.Space), ('A', C.Letter), (' ', C.Space),
+    ('\\@', C.ControlSequence), (' ', C.Space),
+]
+
+
+
+class TestTokenizer(unittest.TestCase):
+
+    def test_sample(self):
+        self.assertEqual(list(Tokenizer(SAMPLE)), SAMPLE_TOKENS)
+
+    def test_codes_are_enum_members(self):
+        sources = [SAMPLE, 'a^b ^^7 ^^zz x^', '\\foo bar\n\n#1 ## #x', 'word, 42 a\\']
+        for source in sources:
+            for coalesce_text in (False, True):
+                for endlinechar in (13, None):
+                    tokenizer = Tokenizer(source, endlinechar=endlinechar, coalesce_text=coalesce_text)
+                    for token in tokenizer:
+                        self.assertIs(type(token.code), CategoryCode, token)
+                        self.assertIs(type(tokenizer.state), State)
+
+    def test_peek(self):
+        tokenizer = Tokenizer('ab')
+        self.assertEqual(tokenizer.peek(), ('a', C.Letter))
+        self.assertEqual(tokenizer.peek(), ('a', C.Letter))
+        self.assertEqual(tokenizer.get_token(), ('a', C.Letter))
+        self.assertEqual(tokenizer.get_token(), ('b', C.Letter))
+        self.assertEqual(tokenizer.get_token(), (' ', C.Space))
+        self.assertFalse(tokenizer.has_token())
+        self.assertIsNone(tokenizer.peek())
+        self.assertIsNone(tokenizer.get_token())
+
+    def test_tokenize_all(self):
+        self.assertEqual(Tokenizer(SAMPLE).tokenize_all(), SAMPLE_TOKENS)
+
+    def test_tokenize_all_after_peek(self):
+        tokenizer = Tokenizer(SAMPLE)
+        self.assertEqual(tokenizer.get_token(), SAMPLE_TOKENS[0])
+        self.assertEqual(tokenizer.peek(), SAMPLE_TOKENS[1])
+        self.assertEqual(tokenizer.tokenize_all(), SAMPLE_TOKENS[1:])
+        self.assertEqual(tokenizer.tokenize_all(), [])
+
+    def test_set_catcode(self):
+        tokenizer = Tokenizer('a@b')
+        tokenizer.set_catcode('@', CategoryCode.Letter)
+        self.assertEqual(tokenizer.get_catcode('@'), CategoryCode.Letter)
+        self.assertEqual(list(tokenizer), [('a', C.Letter), ('@', C.Letter), ('b', C.Letter), (' ', C.Space)])
+
+    def test_set_catcode_after_first_token(self):
+        tokenizer = Tokenizer('a@b@')
+        self.assertEqual(tokenizer.get_token(), ('a', C.Letter))
+        tokenizer.set_catcode('@', CategoryCode.Letter)
+        self.assertEqual(list(tokenizer), [('@', C.Letter), ('b', C.Letter), ('@', C.Letter), (' ', C.Space)])
+
+    def test_set_catcode_invalid(self):
+        tokenizer = Tokenizer('a')
+        for code in (-1, 16, 20, 300, 'x'):
+            with self.assertRaises(ValueError):
+                tokenizer.set_catcode('a', code)
+        with self.assertRaises(ValueError):
+            tokenizer.set_catcode('ab', CategoryCode.Letter)
+        with self.assertRaises(ValueError):
+            tokenizer.set_catcode('一', CategoryCode.Letter)
+
+    def test_get_catcode(self):
+        tokenizer = Tokenizer()
+        self.assertIs(tokenizer.get_catcode('\\'), CategoryCode.EscapeCharacter)
+        self.assertIs(tokenizer.get_catcode('a'), CategoryCode.Letter)
+        self.assertIs(tokenizer.get_catcode('一'), CategoryCode.Other)
+
+    def test_catcodes_view(self):
+        tokenizer = Tokenizer('a@b')
+        self.assertEqual(tokenizer.get_token(), ('a', C.Letter))
+        tokenizer.catcodes['@'] = CategoryCode.Letter
+        self.assertIs(tokenizer.catcodes['@'], CategoryCode.Letter)
+        self.assertEqual(list(tokenizer), [('@', C.Letter), ('b', C.Letter), (' ', C.Space)])
+        with self.assertRaises(ValueError):
+            tokenizer.catcodes['@'] = 20
+
+    def test_hex_character_code(self):
+        self.assertEqual(list(Tokenizer('a^^41b')), [('a', C.Letter), ('A', C.Letter), ('b', C.Letter), (' ', C.Space)])
+
+    def test_superscript_without_hex_digits(self):
+        # anything but ^^ followed by two lowercase hex digits is left as superscript characters
+        self.assertEqual(list(Tokenizer('a^^Mb')), [
+            ('a', C.Letter), ('^', C.Superscript), ('^', C.Superscript), ('M', C.Letter), ('b', C.Letter), (' ', C.Space),
+        ])
+        self.assertEqual(list(Tokenizer('x^^')), [('x', C.Letter), ('^', C.Superscript), ('^', C.Superscript), (' ', C.Space)])
+
+    def test_trailing_escape_without_endlinechar(self):
+        tokenizer = Tokenizer('a\\\nb\\', endlinechar=None)
+        self.assertEqual(list(tokenizer), [('a', C.Letter), ('\\', C.ControlSequence), ('b', C.Letter), ('\\', C.ControlSequence)])
+
+    def test_coalesce_text(self):
+        tokenizer = Tokenizer('hello, a 42 b2 word \\foo bar', coalesce_text=True)
+        self.assertEqual(list(tokenizer), [
+            ('hello,', C.Other), (' ', C.Space), ('a', C.Letter), (' ', C.Space),
+            ('42', C.Other), (' ', C.Space), ('b2', C.Other), (' ', C.Space),
+            ('word', C.Letter), (' ', C.Space),
+            ('\\foo', C.ControlSequence), ('bar', C.Letter), (' ', C.Space),
+        ])
+
+    def test_coalesce_text_same_text(self):
+        # coalescing only joins tokens, it never changes the text
+        tokens = Tokenizer(SAMPLE, coalesce_text=True).tokenize_all()
+        self.assertEqual(''.join(t.value for t in tokens), ''.join(t[0] for t in SAMPLE_TOKENS))
+
+
+
+if __name__ == '__main__':
+    unittest.main()